@@ -1,54 +1,220 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
-from typing import Optional, Dict
-import json
-import os
+from typing import Optional, Dict, Iterable, List, Tuple
 from datetime import datetime
+import asyncio
+import logging
+import os
+import secrets
 
 from app.core.config import settings
 from app.models.user import User, UserInDB, TokenData
+from app.models.user_table import UserTable, UserRecord
+from app.core.user_store import ShardedUserStore, FileState, file_state
+from app.core.bloom_filter import BloomFilter
+
+logger = logging.getLogger(__name__)
 
 # OAuth2 密碼流程
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
 
 # 模擬資料庫 - 在實際開發中應使用真實資料庫
-USERS_FILE = "users.json"
+# 使用者依ID雜湊分散到多個分片檔案，寫入時只重寫相關分片
+user_store = ShardedUserStore(settings.USERS_DIR, settings.USER_SHARD_COUNT)
+
+# 舊版單一檔案資料庫，分片儲存尚為空時於啟動時匯入（原檔案保留不動）
+LEGACY_USERS_FILE = "users.json"
+if os.path.exists(LEGACY_USERS_FILE) and user_store.is_empty():
+    imported = user_store.import_legacy_file(LEGACY_USERS_FILE)
+    logger.warning("已從 %s 匯入 %d 位使用者至 %s", LEGACY_USERS_FILE, imported, settings.USERS_DIR)
+
+# 每個分片的精簡使用者表，依分片檔案狀態 (inode, mtime, size) 判斷是否需要重新載入
+_shard_table_cache: Dict[int, Tuple[FileState, UserTable]] = {}
+
+# 電子郵件存在性過濾器，啟動時由 rebuild_email_filter() 建立；建立前一律視為可能存在
+email_filter: Optional[BloomFilter] = None
+# 進行中的背景重建各自的待補清單，所有過濾器狀態只在事件迴圈執行緒修改
+_rebuild_backlogs: List[List[str]] = []
+_capacity_rebuild_task: Optional[asyncio.Task] = None
+# 過濾器已涵蓋的各索引分片檔案狀態，用於偵測其他 worker 的寫入
+_email_filter_states: Dict[int, FileState] = {}
+
+async def save_user(user_data: dict) -> None:
+    """
+    保存單一使用者，只重寫該使用者所在的分片
+    
+    檔案鎖與寫入在執行緒池中進行，過濾器則回到事件迴圈後才更新
+    
+    Raises:
+        EmailAlreadyRegisteredError: 電子郵件已屬於其他使用者
+    """
+    await run_in_threadpool(user_store.save_user, user_data)
+    _shard_table_cache.pop(user_store.shard_for_user_id(user_data["id"]), None)
+    _add_to_email_filter(user_data["email"])
 
-def get_users_db() -> Dict[str, dict]:
+async def update_user(user_id: str, changes: dict) -> bool:
     """
-    獲取使用者資料庫
+    更新使用者欄位（在執行緒池中寫入），使用者不存在時回傳 False
     """
-    if os.path.exists(USERS_FILE):
-        with open(USERS_FILE, "r") as f:
-            return json.load(f)
-    return {}
+    updated = await run_in_threadpool(user_store.update_user, user_id, changes)
+    _shard_table_cache.pop(user_store.shard_for_user_id(user_id), None)
+    return updated
 
-def save_users_db(users_db: Dict[str, dict]) -> None:
+def normalize_email(email: str) -> str:
     """
-    保存使用者資料庫
+    正規化電子郵件（用於存在性過濾器）
     """
-    with open(USERS_FILE, "w") as f:
-        json.dump(users_db, f)
+    return email.strip().lower()
+
+def build_email_filter() -> Tuple[BloomFilter, Dict[int, FileState]]:
+    """
+    從使用者儲存建立新的電子郵件過濾器，不修改全域狀態，可在執行緒中執行
+    
+    Returns:
+        (新過濾器, 讀取前各索引分片的檔案狀態)
+    """
+    states = {}
+    emails = []
+    for index, (state, index_data) in user_store.load_all_indexes().items():
+        states[index] = state
+        emails.extend(index_data)
+    
+    new_filter = BloomFilter(
+        capacity=max(settings.EMAIL_FILTER_CAPACITY, len(emails) * 2),
+        error_rate=settings.EMAIL_FILTER_ERROR_RATE
+    )
+    for email in emails:
+        new_filter.add(normalize_email(email))
+    return new_filter, states
+
+async def rebuild_email_filter() -> None:
+    """
+    重新建立電子郵件過濾器（Bloom 過濾器不支援刪除，需定期重建）
+    
+    在執行緒中建立新過濾器，建立期間本行程新註冊的電子郵件記錄在待補清單，
+    回到事件迴圈後先補入再替換，替換過程中不會讓出執行權
+    """
+    global email_filter
+    backlog: List[str] = []
+    _rebuild_backlogs.append(backlog)
+    try:
+        new_filter, states = await asyncio.to_thread(build_email_filter)
+    finally:
+        _rebuild_backlogs.remove(backlog)
+    
+    for email in backlog:
+        new_filter.add(email)
+    email_filter = new_filter
+    _email_filter_states.clear()
+    _email_filter_states.update(states)
+
+def _add_to_email_filter(email: str) -> None:
+    """將新註冊的電子郵件加入過濾器及進行中重建的待補清單（僅在事件迴圈執行緒呼叫）"""
+    global _capacity_rebuild_task
+    normalized = normalize_email(email)
+    for backlog in _rebuild_backlogs:
+        backlog.append(normalized)
+    if email_filter is None:
+        return
+    
+    email_filter.add(normalized)
+    if email_filter.count > email_filter.capacity and not _rebuild_backlogs:
+        # 超過容量時誤判率上升，於背景以較大容量重建
+        _capacity_rebuild_task = asyncio.get_running_loop().create_task(rebuild_email_filter())
+
+def email_maybe_registered(email: str) -> bool:
+    """
+    檢查電子郵件是否可能已註冊，回傳 False 表示一定未註冊
+    
+    過濾器未命中時只 stat 該電子郵件的索引分片；若分片自上次讀取後已被
+    修改（例如其他 worker 的註冊），先將其電子郵件補入過濾器再判斷
+    """
+    if email_filter is None:
+        return True
+    
+    normalized = normalize_email(email)
+    if normalized in email_filter:
+        return True
+    
+    index = user_store.index_for_email(email)
+    state = file_state(user_store.index_path(index))
+    if _email_filter_states.get(index) == state:
+        return False
+    
+    for indexed_email in user_store.read_index(index):
+        _add_to_email_filter(indexed_email)
+    _email_filter_states[index] = state
+    return normalized in email_filter
+
+async def rebuild_email_filter_periodically() -> None:
+    """
+    定期重新建立電子郵件過濾器，移除已不存在的電子郵件並調整容量
+    """
+    while True:
+        await asyncio.sleep(settings.EMAIL_FILTER_REBUILD_SECONDS)
+        await rebuild_email_filter()
+
+def get_email_filter_stats() -> dict:
+    """
+    獲取電子郵件過濾器的誤判率與記憶體用量
+    """
+    if email_filter is None:
+        return {"enabled": False}
+    return {"enabled": True, **email_filter.stats()}
+
+def get_shard_table(shard: int) -> UserTable:
+    """
+    獲取分片的精簡使用者表，分片檔案變更時才重新載入
+    """
+    state = file_state(user_store.shard_path(shard))
+    cached = _shard_table_cache.get(shard)
+    if cached is None or cached[0] != state:
+        cached = (state, UserTable.from_users_db(user_store.read_shard(shard)))
+        _shard_table_cache[shard] = cached
+    return cached[1]
+
+def _get_record_by_id(user_id: str) -> Optional[UserRecord]:
+    return get_shard_table(user_store.shard_for_user_id(user_id)).get_by_id(user_id)
 
 def get_user(email: str) -> Optional[UserInDB]:
     """
     通過電子郵件獲取使用者
     """
-    users_db = get_users_db()
-    for user_id, user_data in users_db.items():
-        if user_data["email"] == email:
-            return UserInDB(**user_data)
-    return None
+    shard = user_store.find_shard_for_email(email)
+    if shard is None:
+        return None
+    record = get_shard_table(shard).get_by_email(email)
+    if record is None:
+        return None
+    return record.to_user_in_db()
 
 def get_user_by_id(user_id: str) -> Optional[UserInDB]:
     """
     通過ID獲取使用者
     """
-    users_db = get_users_db()
-    if user_id in users_db:
-        return UserInDB(**users_db[user_id])
-    return None
+    record = _get_record_by_id(user_id)
+    if record is None:
+        return None
+    return record.to_user_in_db()
+
+def get_users_by_ids(user_ids: Iterable[str]) -> Dict[str, UserRecord]:
+    """
+    通過多個ID批次獲取使用者的精簡記錄，每個分片最多讀取一次
+    """
+    ids_by_shard: Dict[int, List[str]] = {}
+    for user_id in set(user_ids):
+        ids_by_shard.setdefault(user_store.shard_for_user_id(user_id), []).append(user_id)
+    
+    records = {}
+    for shard, shard_user_ids in ids_by_shard.items():
+        table = get_shard_table(shard)
+        for user_id in shard_user_ids:
+            record = table.get_by_id(user_id)
+            if record is not None:
+                records[user_id] = record
+    return records
 
 async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
     """
@@ -69,19 +235,11 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
     except JWTError:
         raise credentials_exception
     
-    user = get_user_by_id(user_id=token_data.user_id)
-    if user is None:
+    record = _get_record_by_id(token_data.user_id)
+    if record is None:
         raise credentials_exception
     
-    return User(
-        id=user.id,
-        email=user.email,
-        username=user.username,
-        is_active=user.is_active,
-        is_verified=user.is_verified,
-        created_at=user.created_at,
-        updated_at=user.updated_at
-    )
+    return record.to_user()
 
 async def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
     """
@@ -97,4 +255,22 @@ async def get_current_verified_user(current_user: User = Depends(get_current_act
     """
     if not current_user.is_verified:
         raise HTTPException(status_code=400, detail="帳號尚未驗證")
-    return current_user 
\ No newline at end of file
+    return current_user 
+
+async def verify_metrics_token(x_metrics_token: Optional[str] = Header(default=None)) -> None:
+    """
+    驗證監控指標存取令牌（X-Metrics-Token 標頭），未設定 METRICS_TOKEN 時不開放
+    """
+    if not settings.METRICS_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if x_metrics_token is None or not secrets.compare_digest(x_metrics_token, settings.METRICS_TOKEN):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="無效的監控令牌")
+
+async def verify_introspect_token(x_introspect_token: Optional[str] = Header(default=None)) -> None:
+    """
+    驗證 API 閘道憑證（X-Introspect-Token 標頭），未設定 INTROSPECT_TOKEN 時不開放
+    """
+    if not settings.INTROSPECT_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if x_introspect_token is None or not secrets.compare_digest(x_introspect_token, settings.INTROSPECT_TOKEN):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="無效的閘道憑證")
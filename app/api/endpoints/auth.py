@@ -1,9 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, status
 from fastapi.security import OAuth2PasswordRequestForm
+from fastapi.concurrency import run_in_threadpool
 from datetime import datetime
 import uuid
 from typing import Optional
 from pydantic import BaseModel
+from jose import jwt, JWTError
 
 from app.core.security import (
     verify_password, 
@@ -12,8 +14,26 @@ from app.core.security import (
     create_verification_token, 
     create_user_id
 )
-from app.models.user import UserCreate, User, Token, EmailVerificationRequest
-from app.api.dependencies import get_users_db, save_users_db, get_user, get_user_by_id, get_current_active_user
+from app.models.user import (
+    UserCreate,
+    User,
+    Token,
+    EmailVerificationRequest,
+    TokenIntrospectRequest,
+    TokenIntrospection,
+    TokenIntrospectResponse
+)
+from app.api.dependencies import (
+    save_user,
+    update_user,
+    get_user,
+    get_user_by_id,
+    get_users_by_ids,
+    email_maybe_registered,
+    get_current_active_user,
+    verify_introspect_token
+)
+from app.core.user_store import EmailAlreadyRegisteredError
 from app.services.email_service import EmailService, get_email_service
 from app.core.config import settings
 
@@ -28,10 +48,8 @@ async def register(
     """
     註冊新使用者
     """
-    users_db = get_users_db()
-    
-    # 檢查電子郵件是否已存在
-    if get_user(email=user_in.email):
+    # 檢查電子郵件是否已存在（過濾器確定未註冊時略過查詢）
+    if email_maybe_registered(user_in.email) and get_user(email=user_in.email):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="此電子郵件已註冊"
@@ -39,7 +57,8 @@ async def register(
     
     # 創建新使用者
     user_id = create_user_id()
-    hashed_password = get_password_hash(user_in.password)
+    # bcrypt 在執行緒池中運行，避免阻塞事件迴圈
+    hashed_password = await run_in_threadpool(get_password_hash, user_in.password)
     
     user = {
         "id": user_id,
@@ -52,8 +71,14 @@ async def register(
         "updated_at": None
     }
     
-    users_db[user_id] = user
-    save_users_db(users_db)
+    try:
+        await save_user(user)
+    except EmailAlreadyRegisteredError:
+        # 並行註冊時，寫入前在鎖內的重新檢查發現電子郵件已被使用
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="此電子郵件已註冊"
+        )
     
     # 發送驗證電子郵件
     verification_token = create_verification_token(user_id)
@@ -133,7 +158,7 @@ async def login(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    if not verify_password(form_data.password, user.hashed_password):
+    if not await run_in_threadpool(verify_password, form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="電子郵件或密碼錯誤",
@@ -159,8 +184,6 @@ async def verify_email(
     驗證使用者電子郵件
     """
     try:
-        from jose import jwt, JWTError
-        
         # 解析驗證令牌
         payload = jwt.decode(
             verification_data.token, 
@@ -176,17 +199,16 @@ async def verify_email(
             )
         
         # 更新使用者為已驗證
-        users_db = get_users_db()
-        if user_id not in users_db:
+        updated = await update_user(user_id, {
+            "is_verified": True,
+            "updated_at": datetime.utcnow().isoformat()
+        })
+        if not updated:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="找不到使用者"
             )
         
-        users_db[user_id]["is_verified"] = True
-        users_db[user_id]["updated_at"] = datetime.utcnow().isoformat()
-        save_users_db(users_db)
-        
         return {"message": "電子郵件驗證成功"}
     
     except JWTError:
@@ -267,6 +289,61 @@ async def get_me(
     """
     return current_user 
 
+@router.post(
+    "/auth/introspect",
+    response_model=TokenIntrospectResponse,
+    dependencies=[Depends(verify_introspect_token)]
+)
+async def introspect_tokens(
+    introspect_request: TokenIntrospectRequest
+):
+    """
+    批次檢查訪問令牌（供 API 閘道使用）
+
+    一次驗證多個令牌，並以單次批次查詢取得所有對應的使用者，
+    回傳順序與請求中的令牌順序相同
+    """
+    if len(introspect_request.tokens) > settings.TOKEN_INTROSPECT_MAX_TOKENS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"一次最多只能檢查 {settings.TOKEN_INTROSPECT_MAX_TOKENS} 個令牌"
+        )
+    
+    # 先解析所有令牌，無效令牌記為 None
+    payloads: list = []
+    for token in introspect_request.tokens:
+        try:
+            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
+        except JWTError:
+            payload = None
+        if payload is not None and (not isinstance(payload.get("sub"), str) or payload.get("exp") is None):
+            payload = None
+        payloads.append(payload)
+    
+    # 以單次批次查詢取得所有使用者
+    records = get_users_by_ids(payload["sub"] for payload in payloads if payload is not None)
+    
+    results = []
+    for payload in payloads:
+        if payload is None:
+            results.append(TokenIntrospection(active=False))
+            continue
+        
+        record = records.get(payload["sub"])
+        if record is None:
+            results.append(TokenIntrospection(active=False))
+            continue
+        
+        results.append(TokenIntrospection(
+            active=record.is_active,
+            sub=record.id,
+            exp=datetime.fromtimestamp(payload["exp"]),
+            is_active=record.is_active,
+            is_verified=record.is_verified
+        ))
+    
+    return TokenIntrospectResponse(results=results)
+
 # 用於公開重新發送驗證郵件的模型
 class PublicResendVerificationRequest(BaseModel):
     email: str
@@ -280,7 +357,10 @@ async def public_resend_verification(
     """
     公開API：重新發送驗證電子郵件，不需要登入，但需要提供電子郵件地址
     """
-    # 檢查電子郵件是否存在
+    # 檢查電子郵件是否存在（過濾器確定未註冊時略過查詢）
+    if not email_maybe_registered(verification_request.email):
+        return {"message": "如果電子郵件已註冊，驗證郵件已發送"}
+    
     user = get_user(email=verification_request.email)
     if not user:
         # 為了安全考慮，不透露用戶是否存在
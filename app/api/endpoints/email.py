@@ -1,8 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, status
-from pydantic import BaseModel, EmailStr
-from typing import List, Optional
+import json
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Request, status
+from pydantic import BaseModel, EmailStr, ValidationError
+from typing import AsyncIterator, Dict, List, Optional
 
+from app.core.config import settings
+from app.api.dependencies import get_current_verified_user
+from app.models.user import User
 from app.services.email_service import EmailService, get_email_service
+from app.services.bulk_email_service import (
+    BulkEmailService,
+    MailMergeTemplate,
+    get_bulk_email_service
+)
 
 router = APIRouter(tags=["電子郵件"])
 
@@ -12,6 +21,43 @@ class EmailSchema(BaseModel):
     body: str
     html_content: Optional[str] = None
 
+class BulkEmailTemplateSchema(BaseModel):
+    subject: str
+    body: str
+    html_content: Optional[str] = None
+
+class BulkEmailRecipientSchema(BaseModel):
+    email: EmailStr
+    variables: Dict[str, str] = {}
+
+async def _iter_lines(request: Request) -> AsyncIterator[bytes]:
+    """逐行讀取串流請求內容（NDJSON），略過空行；單行超過 EMAIL_BULK_MAX_LINE_BYTES 時拒絕"""
+    buffer = bytearray()
+    async for data in request.stream():
+        buffer += data
+        start = 0
+        while True:
+            end = buffer.find(b"\n", start)
+            if end == -1:
+                break
+            if end - start > settings.EMAIL_BULK_MAX_LINE_BYTES:
+                break
+            line = bytes(buffer[start:end])
+            start = end + 1
+            if line.strip():
+                yield line
+        del buffer[:start]
+        
+        # 剩餘未換行的內容不可超過單行上限，避免無限累積
+        line_end = buffer.find(b"\n")
+        if (line_end if line_end != -1 else len(buffer)) > settings.EMAIL_BULK_MAX_LINE_BYTES:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"單行內容不可超過 {settings.EMAIL_BULK_MAX_LINE_BYTES} 位元組"
+            )
+    if buffer.strip():
+        yield bytes(buffer)
+
 @router.post("/email/send", status_code=status.HTTP_202_ACCEPTED)
 async def send_email(
     email_data: EmailSchema,
@@ -37,4 +83,77 @@ async def send_email(
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"發送電子郵件時發生錯誤: {str(e)}"
-        ) 
\ No newline at end of file
+        )
+
+@router.post("/email/bulk-send", status_code=status.HTTP_202_ACCEPTED)
+async def bulk_send_email(
+    request: Request,
+    current_user: User = Depends(get_current_verified_user),
+    email_service: EmailService = Depends(get_email_service),
+    bulk_service: BulkEmailService = Depends(get_bulk_email_service)
+):
+    """
+    郵件合併批次發送
+    
+    請求內容為 NDJSON 串流（Content-Type: application/x-ndjson）：
+    第一行為模板 {"subject", "body", "html_content"}，模板中以 $name 作為佔位符；
+    其後每行為一位收件人 {"email", "variables"}。
+    
+    收件人寫入暫存檔後立即回傳任務ID及進度計數，郵件於背景依
+    EMAIL_BULK_CHUNK_SIZE 分批、每批以單一 Gmail 批次請求發送。
+    需要已驗證的使用者登入。
+    """
+    lines = _iter_lines(request)
+    
+    # 解析模板
+    try:
+        template_data = BulkEmailTemplateSchema(**json.loads(await lines.__anext__()))
+    except (StopAsyncIteration, ValueError, TypeError, ValidationError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="第一行必須是有效的郵件模板"
+        )
+    
+    template = MailMergeTemplate(
+        subject=template_data.subject,
+        body=template_data.body,
+        html_content=template_data.html_content
+    )
+    job = bulk_service.create_job(template, owner_id=current_user.id)
+    
+    # 逐行讀取收件人並寫入暫存檔
+    try:
+        with open(job.spool_path, "w") as spool:
+            async for line in lines:
+                try:
+                    recipient = BulkEmailRecipientSchema(**json.loads(line))
+                except (ValueError, TypeError, ValidationError):
+                    job.invalid += 1
+                    continue
+                
+                variables = {"email": recipient.email, **recipient.variables}
+                spool.write(json.dumps([recipient.email, variables]) + "\n")
+                job.received += 1
+    except BaseException:
+        bulk_service.abort_job(job)
+        raise
+    
+    bulk_service.start_job(job, email_service)
+    return job.to_dict()
+
+@router.get("/email/bulk-send/{job_id}")
+async def get_bulk_send_job(
+    job_id: str,
+    current_user: User = Depends(get_current_verified_user),
+    bulk_service: BulkEmailService = Depends(get_bulk_email_service)
+):
+    """
+    查詢批次郵件任務進度（僅限任務建立者）
+    """
+    job_status = bulk_service.get_job_status(job_id)
+    if job_status is None or job_status["owner_id"] != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="找不到批次郵件任務"
+        )
+    return job_status
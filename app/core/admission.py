@@ -0,0 +1,163 @@
+import asyncio
+import time
+from typing import Dict, List
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+
+
+class RouteClass:
+    """一組共用並行上限與排隊期限的路由"""
+    
+    def __init__(self, name: str, concurrency: int, max_queue: int, queue_timeout: float):
+        """
+        初始化路由類別
+        
+        Args:
+            name: 類別名稱
+            concurrency: 同時處理的請求上限
+            max_queue: 排隊等待的請求上限，超過時立即拒絕
+            queue_timeout: 排隊等待的最長秒數，超過時拒絕
+        """
+        self.name = name
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.semaphore = asyncio.Semaphore(concurrency)
+        
+        # 指標
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+    
+    def metrics(self) -> dict:
+        """獲取此類別的排隊指標"""
+        return {
+            "concurrency": self.concurrency,
+            "max_queue": self.max_queue,
+            "queue_timeout_seconds": self.queue_timeout,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+            "avg_wait_seconds": self.total_wait_seconds / self.admitted if self.admitted else 0.0,
+            "max_wait_seconds": self.max_wait_seconds,
+        }
+
+
+class AdmissionController:
+    """依路由類別分配並行額度"""
+    
+    def __init__(self, expensive_paths: List[str]):
+        self.expensive_paths = set(expensive_paths)
+        self.classes: Dict[str, RouteClass] = {
+            "expensive": RouteClass(
+                "expensive",
+                concurrency=settings.ADMISSION_EXPENSIVE_CONCURRENCY,
+                max_queue=settings.ADMISSION_EXPENSIVE_MAX_QUEUE,
+                queue_timeout=settings.ADMISSION_EXPENSIVE_QUEUE_TIMEOUT_SECONDS
+            ),
+            "default": RouteClass(
+                "default",
+                concurrency=settings.ADMISSION_DEFAULT_CONCURRENCY,
+                max_queue=settings.ADMISSION_DEFAULT_MAX_QUEUE,
+                queue_timeout=settings.ADMISSION_DEFAULT_QUEUE_TIMEOUT_SECONDS
+            ),
+        }
+    
+    def classify(self, path: str) -> RouteClass:
+        """判斷請求路徑所屬的路由類別"""
+        if path.rstrip("/") in self.expensive_paths:
+            return self.classes["expensive"]
+        return self.classes["default"]
+    
+    def metrics(self) -> Dict[str, dict]:
+        """獲取所有路由類別的排隊指標"""
+        return {name: route_class.metrics() for name, route_class in self.classes.items()}
+
+
+admission_controller = AdmissionController(
+    [f"{settings.API_V1_STR}{path}" for path in settings.ADMISSION_EXPENSIVE_PATHS]
+)
+
+
+class AdmissionControlMiddleware:
+    """
+    准入控制中間件
+    
+    每個路由類別有獨立的並行上限；排隊已滿或等待超過期限的請求
+    會提早收到 503 及 Retry-After，避免昂貴的路由拖慢便宜的路由
+    """
+    
+    def __init__(self, app: ASGIApp, controller: AdmissionController = admission_controller):
+        self.app = app
+        self.controller = controller
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        route_class = self.controller.classify(scope["path"])
+        
+        start = time.monotonic()
+        if route_class.semaphore.locked():
+            # 額度已用完，需要排隊
+            if route_class.waiting >= route_class.max_queue:
+                route_class.rejected_queue_full += 1
+                await self._reject(scope, receive, send)
+                return
+            
+            route_class.waiting += 1
+            try:
+                await asyncio.wait_for(route_class.semaphore.acquire(), timeout=route_class.queue_timeout)
+            except asyncio.TimeoutError:
+                route_class.rejected_timeout += 1
+                await self._reject(scope, receive, send)
+                return
+            finally:
+                route_class.waiting -= 1
+        else:
+            await route_class.semaphore.acquire()
+        
+        wait_seconds = time.monotonic() - start
+        route_class.admitted += 1
+        route_class.total_wait_seconds += wait_seconds
+        route_class.max_wait_seconds = max(route_class.max_wait_seconds, wait_seconds)
+        
+        route_class.in_flight += 1
+        released = False
+        
+        def release() -> None:
+            nonlocal released
+            if not released:
+                released = True
+                route_class.in_flight -= 1
+                route_class.semaphore.release()
+        
+        async def send_and_release(message: Message) -> None:
+            await send(message)
+            # 回應送出後即釋放額度，之後執行的背景任務（如寄送驗證信）不佔用額度
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                release()
+        
+        try:
+            await self.app(scope, receive, send_and_release)
+        finally:
+            release()
+    
+    async def _reject(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """回傳 503 並附上 Retry-After"""
+        response = JSONResponse(
+            status_code=503,
+            content={"detail": "伺服器忙碌中，請稍後再試"},
+            headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER_SECONDS)}
+        )
+        await response(scope, receive, send)
@@ -0,0 +1,60 @@
+import hashlib
+import math
+from typing import List
+
+
+class BloomFilter:
+    """
+    Bloom 過濾器
+    
+    回答「一定不存在」或「可能存在」，不支援刪除；需要移除元素時請重新建立
+    """
+    
+    def __init__(self, capacity: int, error_rate: float):
+        """
+        初始化 Bloom 過濾器
+        
+        Args:
+            capacity: 預期的元素數量
+            error_rate: 達到預期數量時的目標誤判率
+        """
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.bit_count = max(8, math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.bit_count / capacity * math.log(2)))
+        self.bits = bytearray((self.bit_count + 7) // 8)
+        self.count = 0
+    
+    def _positions(self, item: str) -> List[int]:
+        # 以兩個雜湊值組合出 k 個位置 (Kirsch-Mitzenmacher)
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.bit_count for i in range(self.hash_count)]
+    
+    def add(self, item: str) -> None:
+        """加入元素（已存在時不重複計數）"""
+        positions = self._positions(item)
+        if all(self.bits[position >> 3] & (1 << (position & 7)) for position in positions):
+            return
+        for position in positions:
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+    
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+    
+    def false_positive_rate(self) -> float:
+        """依目前元素數量估算的誤判率"""
+        return (1 - math.exp(-self.hash_count * self.count / self.bit_count)) ** self.hash_count
+    
+    def stats(self) -> dict:
+        """獲取過濾器統計資料"""
+        return {
+            "count": self.count,
+            "capacity": self.capacity,
+            "hash_count": self.hash_count,
+            "memory_bytes": len(self.bits),
+            "target_false_positive_rate": self.error_rate,
+            "estimated_false_positive_rate": self.false_positive_rate(),
+        }
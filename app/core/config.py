@@ -19,6 +19,39 @@ class Settings(BaseSettings):
     JWT_ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     EMAIL_VERIFICATION_TOKEN_EXPIRE_HOURS: int = 48
+    TOKEN_INTROSPECT_MAX_TOKENS: int = 1000
+    # 令牌檢查端點 (/auth/introspect) 的閘道憑證，未設定時不開放
+    INTROSPECT_TOKEN: str = os.getenv("INTROSPECT_TOKEN", "")
+    
+    # 使用者儲存設置 (變更分片數量前需執行 reshard_users.py)
+    USERS_DIR: str = os.getenv("USERS_DIR", "users_db")
+    USER_SHARD_COUNT: int = 16
+    
+    # 電子郵件存在性過濾器設置 (Bloom 過濾器，用於快速排除未註冊的電子郵件)
+    EMAIL_FILTER_ENABLED: bool = True
+    EMAIL_FILTER_CAPACITY: int = 100000
+    EMAIL_FILTER_ERROR_RATE: float = 0.01
+    EMAIL_FILTER_REBUILD_SECONDS: int = 3600
+    
+    # 准入控制設置 (昂貴路由指 bcrypt 密集的登入/註冊，路徑相對於 API_V1_STR)
+    ADMISSION_CONTROL_ENABLED: bool = True
+    ADMISSION_EXPENSIVE_PATHS: List[str] = ["/auth/login", "/auth/register"]
+    ADMISSION_EXPENSIVE_CONCURRENCY: int = 4
+    ADMISSION_EXPENSIVE_MAX_QUEUE: int = 32
+    ADMISSION_EXPENSIVE_QUEUE_TIMEOUT_SECONDS: float = 2.0
+    ADMISSION_DEFAULT_CONCURRENCY: int = 200
+    ADMISSION_DEFAULT_MAX_QUEUE: int = 1000
+    ADMISSION_DEFAULT_QUEUE_TIMEOUT_SECONDS: float = 5.0
+    ADMISSION_RETRY_AFTER_SECONDS: int = 1
+    
+    # 事件迴圈阻塞偵測設置
+    LOOP_MONITOR_ENABLED: bool = True
+    LOOP_MONITOR_INTERVAL_SECONDS: float = 0.1
+    LOOP_STALL_THRESHOLD_SECONDS: float = 0.25
+    LOOP_STALL_REPORTS_KEPT: int = 50
+    
+    # 監控指標設置 (/metrics/*)，未設定 METRICS_TOKEN 時不開放
+    METRICS_TOKEN: str = os.getenv("METRICS_TOKEN", "")
     
     # Email 設置
     TOKEN_PATH: str = os.getenv("TOKEN_PATH", "token.json")
@@ -26,6 +59,13 @@ class Settings(BaseSettings):
     EMAILS_FROM_NAME: str = os.getenv("EMAILS_FROM_NAME", "App_Dev_Toolkit")
     SERVER_HOST: str = os.getenv("SERVER_HOST", "localhost")
     
+    # 批次郵件設置 (Gmail 批次請求每批最多 100 封)
+    EMAIL_BULK_CHUNK_SIZE: int = 100
+    EMAIL_BULK_MAX_LINE_BYTES: int = 65536
+    EMAIL_BULK_JOBS_DIR: str = os.getenv("EMAIL_BULK_JOBS_DIR", "bulk_email_jobs")
+    EMAIL_BULK_JOB_TTL_SECONDS: int = 3600
+    EMAIL_BULK_MAX_JOBS: int = 1000
+    
     # 驗證URL (前端頁面URL)
     FRONTEND_URL: str = os.getenv("FRONTEND_URL", "http://localhost:8081")
     FRONTEND_VERIFICATION_URL: str = os.getenv("FRONTEND_VERIFICATION_URL", "http://localhost:8081/(tabs)/verifyemail")
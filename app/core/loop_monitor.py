@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+import weakref
+from collections import deque
+from datetime import datetime
+from typing import Optional, Tuple
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 事件迴圈延遲直方圖的區間上限（秒）
+LAG_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, float("inf")]
+
+
+class LoopMonitor:
+    """
+    事件迴圈阻塞偵測器
+    
+    迴圈中的心跳任務定期更新時間戳並記錄延遲；另一個監視執行緒在心跳
+    超過門檻未更新時，擷取事件迴圈執行緒的堆疊及正在執行的路由
+    """
+    
+    def __init__(self, interval: float, threshold: float, reports_kept: int):
+        """
+        初始化偵測器
+        
+        Args:
+            interval: 心跳間隔秒數
+            threshold: 視為阻塞的延遲秒數
+            reports_kept: 保留的阻塞報告數量
+        """
+        self.interval = interval
+        self.threshold = threshold
+        self.reports = deque(maxlen=reports_kept)
+        self.lag_histogram = [0] * len(LAG_BUCKETS)
+        self.stalls = 0
+        self.max_lag_seconds = 0.0
+        
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._last_beat = 0.0
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._open_report: Optional[Tuple[float, dict]] = None
+        self._task_routes: "weakref.WeakKeyDictionary[asyncio.Task, str]" = weakref.WeakKeyDictionary()
+    
+    def start(self) -> None:
+        """在事件迴圈中啟動心跳任務與監視執行緒"""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopped.clear()
+        self._heartbeat_task = asyncio.create_task(self._heartbeat())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-monitor", daemon=True)
+        self._watchdog.start()
+    
+    async def stop(self) -> None:
+        """停止心跳任務與監視執行緒"""
+        self._stopped.set()
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            try:
+                await self._heartbeat_task
+            except asyncio.CancelledError:
+                pass
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=self.interval * 2)
+    
+    def track(self, route: str) -> None:
+        """記錄目前任務正在處理的路由"""
+        task = asyncio.current_task()
+        if task is not None:
+            self._task_routes[task] = route
+    
+    async def _heartbeat(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            previous_beat = self._last_beat
+            self._last_beat = now
+            lag = max(0.0, now - expected)
+            self._record_lag(lag)
+            
+            # 阻塞結束，以實際延遲更新監視執行緒先前建立的報告
+            open_report = self._open_report
+            if open_report is not None and open_report[0] == previous_beat:
+                self._open_report = None
+                report = open_report[1]
+                report["stalled_seconds"] = lag
+                report["ongoing"] = False
+                logger.warning("事件迴圈阻塞已結束，共 %.3f 秒（路由：%s）", lag, report["route"] or "未知")
+    
+    def _record_lag(self, lag: float) -> None:
+        for i, bucket in enumerate(LAG_BUCKETS):
+            if lag <= bucket:
+                self.lag_histogram[i] += 1
+                break
+        self.max_lag_seconds = max(self.max_lag_seconds, lag)
+    
+    def _watch(self) -> None:
+        reported_beat = None
+        while not self._stopped.wait(self.interval):
+            last_beat = self._last_beat
+            stalled_for = time.monotonic() - last_beat - self.interval
+            if stalled_for > self.threshold and reported_beat != last_beat:
+                # 每次阻塞只回報一次
+                reported_beat = last_beat
+                self._report_stall(last_beat, stalled_for)
+    
+    def _report_stall(self, last_beat: float, stalled_for: float) -> None:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = traceback.format_stack(frame) if frame is not None else []
+        
+        route = None
+        task = asyncio.current_task(self._loop)
+        if task is not None:
+            route = self._task_routes.get(task)
+        
+        self.stalls += 1
+        # stalled_seconds 先記錄偵測當下的阻塞時間，心跳恢復後更新為實際長度
+        report = {
+            "detected_at": datetime.utcnow(),
+            "stalled_seconds": stalled_for,
+            "ongoing": True,
+            "route": route,
+        }
+        self.reports.append(report)
+        self._open_report = (last_beat, report)
+        # 堆疊含檔案路徑與原始碼，只寫入日誌，不經 HTTP 回傳
+        logger.warning(
+            "事件迴圈已阻塞 %.3f 秒（路由：%s）\n%s",
+            stalled_for,
+            route or "未知",
+            "".join(stack)
+        )
+    
+    def metrics(self) -> dict:
+        """獲取阻塞計數、延遲直方圖及最近的阻塞報告（堆疊僅見於日誌）"""
+        return {
+            "interval_seconds": self.interval,
+            "stall_threshold_seconds": self.threshold,
+            "stalls": self.stalls,
+            "max_lag_seconds": self.max_lag_seconds,
+            "lag_histogram": {
+                ("+Inf" if bucket == float("inf") else str(bucket)): count
+                for bucket, count in zip(LAG_BUCKETS, self.lag_histogram)
+            },
+            "recent_stalls": list(self.reports),
+        }
+
+
+loop_monitor = LoopMonitor(
+    interval=settings.LOOP_MONITOR_INTERVAL_SECONDS,
+    threshold=settings.LOOP_STALL_THRESHOLD_SECONDS,
+    reports_kept=settings.LOOP_STALL_REPORTS_KEPT
+)
+
+
+class LoopMonitorMiddleware:
+    """記錄每個請求任務的路由，供阻塞報告使用"""
+    
+    def __init__(self, app: ASGIApp, monitor: LoopMonitor = loop_monitor):
+        self.app = app
+        self.monitor = monitor
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            self.monitor.track(f"{scope['method']} {scope['path']}")
+        await self.app(scope, receive, send)
@@ -0,0 +1,257 @@
+import glob
+import json
+import os
+import tempfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# 檔案狀態 (inode, mtime, size)，用於判斷快取是否過期；
+# 寫入皆以 os.replace 取代檔案，inode 一定會改變，不受 mtime 精度影響
+FileState = Tuple[int, int, int]
+
+META_FILE = "meta.json"
+SHARD_FILE_PATTERN = "users-{:04d}.json"
+INDEX_FILE_PATTERN = "email-index-{:04d}.json"
+
+
+def _stable_hash(value: str) -> int:
+    """跨行程穩定的雜湊值（內建 hash() 每個行程不同）"""
+    return zlib.crc32(value.encode("utf-8"))
+
+
+def file_state(path: str) -> FileState:
+    """獲取檔案狀態，檔案不存在時回傳 (0, 0, 0)"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return (0, 0, 0)
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def _read_json(path: str) -> dict:
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            return json.load(f)
+    return {}
+
+
+def _write_json(path: str, data: dict) -> None:
+    """先寫入唯一的暫存檔再取代，讀取者不會看到寫到一半的檔案"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+@contextmanager
+def _file_lock(path: str) -> Iterator[None]:
+    """以 <path>.lock 檔案作為跨行程的互斥鎖"""
+    with open(f"{path}.lock", "a+") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class EmailAlreadyRegisteredError(ValueError):
+    """電子郵件已屬於其他使用者"""
+
+
+class ShardedUserStore:
+    """
+    分片的檔案使用者儲存
+    
+    使用者依 ID 的雜湊值分散到 N 個分片檔案，另以電子郵件雜湊值分片的
+    索引記錄每個電子郵件所在的分片。寫入時只以檔案鎖鎖定並重寫相關的分片，
+    多個 uvicorn worker 之間也互斥。
+    """
+    
+    def __init__(self, directory: str, shard_count: int):
+        """
+        初始化分片儲存
+        
+        Args:
+            directory: 分片檔案所在目錄
+            shard_count: 分片數量，必須與目錄中已存在的分片數量相同
+        """
+        self.directory = directory
+        self.shard_count = shard_count
+        self._index_cache: Dict[int, Tuple[FileState, Dict[str, int]]] = {}
+        
+        meta = _read_json(os.path.join(directory, META_FILE))
+        if meta and meta["shard_count"] != shard_count:
+            raise ValueError(
+                f"使用者資料目前分為 {meta['shard_count']} 個分片，"
+                f"與設定的 {shard_count} 不符，請先執行 reshard_users.py"
+            )
+    
+    def shard_for_user_id(self, user_id: str) -> int:
+        """使用者ID所在的分片"""
+        return _stable_hash(user_id) % self.shard_count
+    
+    def index_for_email(self, email: str) -> int:
+        """電子郵件所在的索引分片"""
+        return _stable_hash(email) % self.shard_count
+    
+    def shard_path(self, shard: int) -> str:
+        return os.path.join(self.directory, SHARD_FILE_PATTERN.format(shard))
+    
+    def index_path(self, index: int) -> str:
+        return os.path.join(self.directory, INDEX_FILE_PATTERN.format(index))
+    
+    def read_shard(self, shard: int) -> Dict[str, dict]:
+        """讀取單一分片"""
+        return _read_json(self.shard_path(shard))
+    
+    def read_index(self, index: int) -> Dict[str, int]:
+        """讀取單一索引分片（電子郵件 -> 分片），檔案未變更時使用快取"""
+        state = file_state(self.index_path(index))
+        cached = self._index_cache.get(index)
+        if cached is None or cached[0] != state:
+            cached = (state, _read_json(self.index_path(index)))
+            self._index_cache[index] = cached
+        return cached[1]
+    
+    def _read_index_with_state(self, index: int) -> Tuple[FileState, Dict[str, int]]:
+        # 先記錄狀態再讀取：讀取期間若被修改，記錄的狀態較舊，之後會再補讀
+        state = file_state(self.index_path(index))
+        return state, self.read_index(index)
+    
+    def load_all_indexes(self) -> Dict[int, Tuple[FileState, Dict[str, int]]]:
+        """平行讀取所有索引分片，回傳各分片讀取前的檔案狀態與內容"""
+        with ThreadPoolExecutor() as executor:
+            return dict(enumerate(executor.map(self._read_index_with_state, range(self.shard_count))))
+    
+    def find_shard_for_email(self, email: str) -> Optional[int]:
+        """通過電子郵件索引查詢使用者所在的分片"""
+        return self.read_index(self.index_for_email(email)).get(email)
+    
+    def save_user(self, user_data: dict) -> None:
+        """
+        新增或更新單一使用者，只重寫該使用者的分片與索引分片
+        
+        固定先鎖資料分片再鎖索引分片；在鎖內重新確認電子郵件未被其他使用者
+        佔用，並先寫索引再寫資料，中途失敗也不會留下索引找不到的使用者
+        
+        Raises:
+            EmailAlreadyRegisteredError: 電子郵件已屬於其他使用者
+        """
+        self._ensure_directory()
+        user_id = user_data["id"]
+        email = user_data["email"]
+        shard = self.shard_for_user_id(user_id)
+        index = self.index_for_email(email)
+        
+        with _file_lock(self.shard_path(shard)), _file_lock(self.index_path(index)):
+            index_data = _read_json(self.index_path(index))
+            indexed_shard = index_data.get(email)
+            if indexed_shard is not None:
+                for other_id, other_data in self.read_shard(indexed_shard).items():
+                    if other_data["email"] == email and other_id != user_id:
+                        raise EmailAlreadyRegisteredError(email)
+            
+            if indexed_shard != shard:
+                index_data[email] = shard
+                _write_json(self.index_path(index), index_data)
+                self._index_cache[index] = (file_state(self.index_path(index)), index_data)
+            
+            shard_data = self.read_shard(shard)
+            shard_data[user_id] = user_data
+            _write_json(self.shard_path(shard), shard_data)
+    
+    def update_user(self, user_id: str, changes: dict) -> bool:
+        """
+        更新使用者欄位（不可變更電子郵件）
+        
+        Returns:
+            使用者不存在時回傳 False
+        """
+        shard = self.shard_for_user_id(user_id)
+        if not os.path.exists(self.shard_path(shard)):
+            # 分片（或整個目錄）尚未建立，使用者一定不存在
+            return False
+        with _file_lock(self.shard_path(shard)):
+            shard_data = self.read_shard(shard)
+            if user_id not in shard_data:
+                return False
+            shard_data[user_id].update(changes)
+            _write_json(self.shard_path(shard), shard_data)
+        return True
+    
+    def save_all(self, users_db: Dict[str, dict]) -> None:
+        """重寫所有分片與索引"""
+        self._ensure_directory()
+        shards = [{} for _ in range(self.shard_count)]
+        indexes = [{} for _ in range(self.shard_count)]
+        for user_id, user_data in users_db.items():
+            shard = self.shard_for_user_id(user_id)
+            shards[shard][user_id] = user_data
+            indexes[self.index_for_email(user_data["email"])][user_data["email"]] = shard
+        
+        for shard, shard_data in enumerate(shards):
+            with _file_lock(self.shard_path(shard)):
+                _write_json(self.shard_path(shard), shard_data)
+        for index, index_data in enumerate(indexes):
+            with _file_lock(self.index_path(index)):
+                _write_json(self.index_path(index), index_data)
+                self._index_cache[index] = (file_state(self.index_path(index)), index_data)
+    
+    def is_empty(self) -> bool:
+        """目錄中尚未建立任何分片"""
+        return not os.path.exists(os.path.join(self.directory, META_FILE))
+    
+    def import_legacy_file(self, path: str) -> int:
+        """
+        匯入舊版單一 users.json，僅在儲存尚為空時執行
+        
+        Returns:
+            匯入的使用者數量
+        """
+        directory = os.path.abspath(self.directory)
+        with _file_lock(f"{directory}-import"):
+            if not self.is_empty():
+                return 0
+            # 先寫入暫存目錄再整個取代，其他 worker 不會讀到匯入一半的分片
+            users_db = _read_json(path)
+            tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(directory))
+            ShardedUserStore(tmp_dir, self.shard_count).save_all(users_db)
+            if os.path.isdir(directory):
+                os.rmdir(directory)
+            os.replace(tmp_dir, directory)
+        return len(users_db)
+    
+    def _ensure_directory(self) -> None:
+        meta_path = os.path.join(self.directory, META_FILE)
+        if not os.path.exists(meta_path):
+            os.makedirs(self.directory, exist_ok=True)
+            _write_json(meta_path, {"shard_count": self.shard_count})
+
+
+def load_users_from_directory(directory: str) -> Dict[str, dict]:
+    """讀取目錄中所有分片（不論分片數量），供重新分片工具使用"""
+    users_db: Dict[str, dict] = {}
+    for path in sorted(glob.glob(os.path.join(directory, "users-*.json"))):
+        users_db.update(_read_json(path))
+    return users_db
@@ -1,20 +1,59 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import uvicorn
 from typing import Dict, List, Any
 import os
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi.responses import RedirectResponse
 
 from app.api.endpoints import email_router, auth_router
+from app.api.dependencies import (
+    rebuild_email_filter,
+    rebuild_email_filter_periodically,
+    get_email_filter_stats,
+    verify_metrics_token
+)
+from app.core.config import settings
+from app.core.admission import AdmissionControlMiddleware, admission_controller
+from app.core.loop_monitor import LoopMonitorMiddleware, loop_monitor
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 啟動事件迴圈阻塞偵測
+    if settings.LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
+    
+    # 從使用者儲存建立電子郵件過濾器，並定期重建
+    rebuild_task = None
+    if settings.EMAIL_FILTER_ENABLED:
+        await rebuild_email_filter()
+        rebuild_task = asyncio.create_task(rebuild_email_filter_periodically())
+    
+    yield
+    
+    if rebuild_task is not None:
+        rebuild_task.cancel()
+    if settings.LOOP_MONITOR_ENABLED:
+        await loop_monitor.stop()
 
 app = FastAPI(
     title="App_Dev_Toolkit API",
     description="基於 Docker 的 App 開發工具箱 API 服務",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
-# 配置 CORS 中間件
+# 配置事件迴圈阻塞偵測中間件，記錄每個請求的路由
+if settings.LOOP_MONITOR_ENABLED:
+    app.add_middleware(LoopMonitorMiddleware, monitor=loop_monitor)
+
+# 配置准入控制中間件，限制昂貴路由（登入/註冊）的並行數
+if settings.ADMISSION_CONTROL_ENABLED:
+    app.add_middleware(AdmissionControlMiddleware, controller=admission_controller)
+
+# 配置 CORS 中間件（最後加入者位於最外層，讓 503 回應也帶有 CORS 標頭）
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # 在生產環境中應該限制為特定來源
@@ -32,5 +71,20 @@ app.include_router(auth_router, prefix="/api/v1")
 async def redirect_to_docs():
     return RedirectResponse(url="/docs")
 
+# 准入控制排隊指標
+@app.get("/metrics/admission", dependencies=[Depends(verify_metrics_token)])
+async def admission_metrics():
+    return admission_controller.metrics()
+
+# 事件迴圈延遲及阻塞報告
+@app.get("/metrics/event-loop", dependencies=[Depends(verify_metrics_token)])
+async def event_loop_metrics():
+    return loop_monitor.metrics()
+
+# 電子郵件過濾器誤判率及記憶體用量
+@app.get("/metrics/email-filter", dependencies=[Depends(verify_metrics_token)])
+async def email_filter_metrics():
+    return get_email_filter_stats()
+
 if __name__ == "__main__":
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel, EmailStr, Field
 
 
@@ -51,4 +51,23 @@ class TokenData(BaseModel):
 
 class EmailVerificationRequest(BaseModel):
     """電子郵件驗證請求模型"""
-    token: str 
\ No newline at end of file
+    token: str 
+
+
+class TokenIntrospectRequest(BaseModel):
+    """批次令牌檢查請求模型"""
+    tokens: List[str]
+
+
+class TokenIntrospection(BaseModel):
+    """單一令牌檢查結果模型"""
+    active: bool
+    sub: Optional[str] = None
+    exp: Optional[datetime] = None
+    is_active: Optional[bool] = None
+    is_verified: Optional[bool] = None
+
+
+class TokenIntrospectResponse(BaseModel):
+    """批次令牌檢查回應模型"""
+    results: List[TokenIntrospection]
@@ -0,0 +1,150 @@
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, Optional, Union
+
+from app.models.user import User, UserInDB
+
+logger = logging.getLogger(__name__)
+
+# 時間戳以自 epoch 起的微秒整數存放（naive UTC，與 datetime.utcnow() 一致）
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+# 布林欄位打包為單一整數旗標
+FLAG_ACTIVE = 1
+FLAG_VERIFIED = 2
+
+
+def _pack_datetime(value: Optional[str]) -> Optional[int]:
+    """將 ISO 格式時間字串轉為微秒整數"""
+    if value is None:
+        return None
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return (dt - _EPOCH) // _MICROSECOND
+
+
+def _unpack_datetime(value: Optional[int]) -> Optional[datetime]:
+    """將微秒整數轉回 datetime"""
+    if value is None:
+        return None
+    return _EPOCH + timedelta(microseconds=value)
+
+
+def _pack_user_id(user_id: str) -> Union[bytes, str]:
+    """標準格式的 UUID 轉為 16 位元組，其他格式的ID保留原字串"""
+    try:
+        packed = uuid.UUID(user_id)
+    except (ValueError, TypeError, AttributeError):
+        return user_id
+    if str(packed) != user_id:
+        return user_id
+    return packed.bytes
+
+
+class UserRecord:
+    """
+    精簡的使用者記錄
+    
+    ID 以 16 位元組存放（非標準 UUID 的ID保留原字串）、布林值打包為旗標、時間戳以整數存放，
+    僅在需要時才建立 User/UserInDB 物件
+    """
+    __slots__ = ("uid", "email", "username", "hashed_password", "flags", "created_at", "updated_at")
+    
+    def __init__(self, user_data: dict):
+        self.uid = _pack_user_id(user_data["id"])
+        self.email = user_data["email"]
+        self.username = user_data["username"]
+        self.hashed_password = user_data["hashed_password"].encode("ascii")
+        self.flags = (
+            (FLAG_ACTIVE if user_data.get("is_active", True) else 0)
+            | (FLAG_VERIFIED if user_data.get("is_verified", False) else 0)
+        )
+        self.created_at = _pack_datetime(user_data["created_at"])
+        self.updated_at = _pack_datetime(user_data.get("updated_at"))
+    
+    @property
+    def id(self) -> str:
+        if isinstance(self.uid, bytes):
+            return str(uuid.UUID(bytes=self.uid))
+        return self.uid
+    
+    @property
+    def is_active(self) -> bool:
+        return bool(self.flags & FLAG_ACTIVE)
+    
+    @property
+    def is_verified(self) -> bool:
+        return bool(self.flags & FLAG_VERIFIED)
+    
+    def to_user(self) -> User:
+        """建立 User 物件"""
+        return User(
+            id=self.id,
+            email=self.email,
+            username=self.username,
+            is_active=self.is_active,
+            is_verified=self.is_verified,
+            created_at=_unpack_datetime(self.created_at),
+            updated_at=_unpack_datetime(self.updated_at)
+        )
+    
+    def to_user_in_db(self) -> UserInDB:
+        """建立 UserInDB 物件"""
+        return UserInDB(
+            id=self.id,
+            email=self.email,
+            username=self.username,
+            hashed_password=self.hashed_password.decode("ascii"),
+            is_active=self.is_active,
+            is_verified=self.is_verified,
+            created_at=_unpack_datetime(self.created_at),
+            updated_at=_unpack_datetime(self.updated_at)
+        )
+
+
+class UserTable:
+    """以 UserRecord 組成的記憶體使用者表，提供 ID 與電子郵件索引"""
+    __slots__ = ("_by_id", "_by_email")
+    
+    def __init__(self):
+        self._by_id: Dict[Union[bytes, str], UserRecord] = {}
+        self._by_email: Dict[str, UserRecord] = {}
+    
+    @classmethod
+    def from_users_db(cls, users_db: Dict[str, dict]) -> "UserTable":
+        """從使用者資料庫字典建立使用者表"""
+        table = cls()
+        for user_id, user_data in users_db.items():
+            try:
+                table.add(user_data)
+            except (KeyError, ValueError, TypeError, AttributeError):
+                # 單筆損壞的資料不應讓整個分片無法使用
+                logger.warning("略過無法解析的使用者資料：%s", user_id)
+        return table
+    
+    def add(self, user_data: dict) -> UserRecord:
+        """新增或取代一位使用者"""
+        record = UserRecord(user_data)
+        old = self._by_id.get(record.uid)
+        if old is not None and old.email != record.email:
+            del self._by_email[old.email]
+        self._by_id[record.uid] = record
+        self._by_email[record.email] = record
+        return record
+    
+    def get_by_id(self, user_id: str) -> Optional[UserRecord]:
+        """通過ID獲取使用者記錄"""
+        return self._by_id.get(_pack_user_id(user_id))
+    
+    def get_by_email(self, email: str) -> Optional[UserRecord]:
+        """通過電子郵件獲取使用者記錄"""
+        return self._by_email.get(email)
+    
+    def __len__(self) -> int:
+        return len(self._by_id)
+    
+    def __iter__(self) -> Iterator[UserRecord]:
+        return iter(self._by_id.values())
@@ -0,0 +1,266 @@
+import asyncio
+import glob
+import html
+import json
+import os
+import tempfile
+import time
+import uuid
+from datetime import datetime
+from string import Template
+from typing import Dict, List, Optional, TextIO, Tuple
+
+from app.core.config import settings
+from app.services.email_service import EmailService
+
+
+class MailMergeTemplate:
+    """郵件合併模板，只解析一次並供所有收件人共用"""
+    
+    def __init__(self, subject: str, body: str, html_content: Optional[str] = None):
+        """
+        初始化郵件合併模板
+        
+        Args:
+            subject: 郵件主題模板
+            body: 純文本郵件內容模板
+            html_content: HTML 格式郵件內容模板（可選）
+        """
+        self.subject = Template(subject)
+        self.body = Template(body)
+        self.html_content = Template(html_content) if html_content else None
+    
+    def render(self, variables: Dict[str, str]) -> Tuple[str, str, Optional[str]]:
+        """
+        以收件人變數渲染郵件
+        
+        Args:
+            variables: 收件人變數，對應模板中的 $name 佔位符
+        
+        Returns:
+            (主題, 純文本內容, HTML 內容)
+        """
+        subject = self.subject.safe_substitute(variables)
+        body = self.body.safe_substitute(variables)
+        html_content = None
+        if self.html_content is not None:
+            escaped = {key: html.escape(str(value)) for key, value in variables.items()}
+            html_content = self.html_content.safe_substitute(escaped)
+        return subject, body, html_content
+
+
+class BulkEmailJob:
+    """批次郵件任務及其進度計數"""
+    
+    def __init__(self, template: MailMergeTemplate, owner_id: str):
+        self.id = str(uuid.uuid4())
+        self.owner_id = owner_id
+        self.template = template
+        self.status = "receiving"
+        self.received = 0
+        self.invalid = 0
+        self.sent = 0
+        self.failed = 0
+        self.created_at = datetime.utcnow()
+        self.finished_at: Optional[datetime] = None
+        self.spool_path: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+    
+    def to_dict(self) -> dict:
+        """轉換為 API 回應格式"""
+        return {
+            "job_id": self.id,
+            "owner_id": self.owner_id,
+            "status": self.status,
+            "received": self.received,
+            "invalid": self.invalid,
+            "sent": self.sent,
+            "failed": self.failed,
+            "pending": self.received - self.sent - self.failed,
+            "created_at": self.created_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class BulkEmailService:
+    """
+    郵件合併批次發送服務
+    
+    收件人先寫入暫存檔（磁碟，不佔用記憶體），上傳完成後立即回傳任務ID，
+    再於背景逐批讀取暫存檔並發送。任務進度寫入 EMAIL_BULK_JOBS_DIR 中的
+    狀態檔，任何 worker 都能查詢；記憶體中只保留本行程執行中的任務
+    """
+    
+    def __init__(self, jobs_dir: str = settings.EMAIL_BULK_JOBS_DIR):
+        self.jobs_dir = jobs_dir
+        self.jobs: Dict[str, BulkEmailJob] = {}
+    
+    def create_job(self, template: MailMergeTemplate, owner_id: str) -> BulkEmailJob:
+        """
+        建立批次郵件任務及其收件人暫存檔
+        
+        Args:
+            template: 共用的郵件合併模板
+            owner_id: 建立任務的使用者ID
+        
+        Returns:
+            新建立的 BulkEmailJob
+        """
+        self._evict_status_files()
+        job = BulkEmailJob(template, owner_id)
+        fd, job.spool_path = tempfile.mkstemp(prefix=f"bulk-email-{job.id}-", suffix=".ndjson")
+        os.close(fd)
+        self.jobs[job.id] = job
+        self._save_status(job)
+        return job
+    
+    def _status_path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+    
+    def _save_status(self, job: BulkEmailJob) -> None:
+        """將任務進度寫入狀態檔（先寫暫存檔再取代）"""
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.jobs_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(job.to_dict(), f)
+        os.replace(tmp_path, self._status_path(job.id))
+    
+    def _evict_status_files(self) -> None:
+        """刪除超過保存期限的狀態檔，並將狀態檔數量限制在 EMAIL_BULK_MAX_JOBS 以內"""
+        if not os.path.isdir(self.jobs_dir):
+            return
+        expire_before = time.time() - settings.EMAIL_BULK_JOB_TTL_SECONDS
+        paths = sorted(
+            glob.glob(os.path.join(self.jobs_dir, "*.json")),
+            key=os.path.getmtime,
+            reverse=True
+        )
+        for i, path in enumerate(paths):
+            # 執行中的任務每批都會更新狀態檔，因此最舊的檔案都是已結束的任務
+            if i >= settings.EMAIL_BULK_MAX_JOBS - 1 or os.path.getmtime(path) < expire_before:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+    
+    def get_job_status(self, job_id: str) -> Optional[dict]:
+        """
+        通過ID獲取批次郵件任務進度，任務可能由其他 worker 執行
+        
+        Returns:
+            任務進度，找不到時回傳 None
+        """
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        
+        try:
+            if str(uuid.UUID(job_id)) != job_id:
+                return None
+        except ValueError:
+            return None
+        try:
+            with open(self._status_path(job_id), "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+    
+    def start_job(self, job: BulkEmailJob, email_service: EmailService) -> None:
+        """
+        收件人已全部寫入暫存檔，於背景開始發送
+        
+        Args:
+            job: 批次郵件任務
+            email_service: 用於發送郵件的 EmailService
+        """
+        job.status = "sending"
+        self._save_status(job)
+        job.task = asyncio.create_task(self._run_job(job, email_service))
+    
+    def abort_job(self, job: BulkEmailJob) -> None:
+        """上傳失敗時結束任務並刪除暫存檔"""
+        job.status = "failed"
+        job.failed = job.received
+        job.finished_at = datetime.utcnow()
+        self._remove_spool(job)
+        self._save_status(job)
+        self.jobs.pop(job.id, None)
+    
+    async def _run_job(self, job: BulkEmailJob, email_service: EmailService) -> None:
+        """逐批讀取暫存檔、渲染並發送郵件"""
+        try:
+            with open(job.spool_path, "r") as spool:
+                while True:
+                    chunk = await asyncio.to_thread(self._read_chunk, spool)
+                    if not chunk:
+                        break
+                    
+                    sent, failed = await asyncio.to_thread(self._send_chunk, job.template, chunk, email_service)
+                    job.sent += sent
+                    job.failed += failed
+                    self._save_status(job)
+            
+            job.status = "completed"
+        finally:
+            if job.status != "completed":
+                # 尚未發送的收件人計為失敗
+                job.status = "failed"
+                job.failed = job.received - job.sent
+            job.finished_at = datetime.utcnow()
+            self._remove_spool(job)
+            self._save_status(job)
+            self.jobs.pop(job.id, None)
+    
+    @staticmethod
+    def _read_chunk(spool: TextIO) -> List[Tuple[str, Dict[str, str]]]:
+        """從暫存檔讀取下一批收件人"""
+        chunk = []
+        for line in spool:
+            email, variables = json.loads(line)
+            chunk.append((email, variables))
+            if len(chunk) >= settings.EMAIL_BULK_CHUNK_SIZE:
+                break
+        return chunk
+    
+    @staticmethod
+    def _remove_spool(job: BulkEmailJob) -> None:
+        if job.spool_path is not None and os.path.exists(job.spool_path):
+            os.remove(job.spool_path)
+        job.spool_path = None
+    
+    @staticmethod
+    def _send_chunk(
+        template: MailMergeTemplate,
+        chunk: List[Tuple[str, Dict[str, str]]],
+        email_service: EmailService
+    ) -> Tuple[int, int]:
+        """渲染並發送一批郵件，無法建立的郵件計為失敗"""
+        messages = []
+        failed = 0
+        for email, variables in chunk:
+            try:
+                subject, body, html_content = template.render(variables)
+                messages.append(email_service.create_message([email], subject, body, html_content))
+            except Exception:
+                failed += 1
+        
+        if not messages:
+            return 0, failed
+        try:
+            sent, batch_failed = email_service.send_batch(messages)
+        except Exception:
+            sent, batch_failed = 0, len(messages)
+        return sent, failed + batch_failed
+
+bulk_email_service = BulkEmailService()
+
+
+# 依賴注入函數
+def get_bulk_email_service() -> BulkEmailService:
+    """
+    獲取 BulkEmailService 實例用於依賴注入
+    
+    Returns:
+        BulkEmailService 實例
+    """
+    return bulk_email_service
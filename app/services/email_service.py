@@ -1,6 +1,7 @@
 import os
+import asyncio
 import base64
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
@@ -58,7 +59,7 @@ class EmailService:
         with open(self.token_path, "r") as token_file:
             return eval(token_file.read())
     
-    def _create_message(self, to: List[str], subject: str, body: str, html_content: Optional[str] = None):
+    def create_message(self, to: List[str], subject: str, body: str, html_content: Optional[str] = None):
         """
         創建郵件訊息
         
@@ -101,15 +102,41 @@ class EmailService:
         """
         try:
             # 創建郵件訊息
-            message = self._create_message(to, subject, body, html_content)
+            message = self.create_message(to, subject, body, html_content)
             
-            # 發送郵件
-            result = self.service.users().messages().send(userId="me", body=message).execute()
+            # 發送郵件（阻塞的 HTTP 請求在執行緒中執行，避免阻塞事件迴圈）
+            request = self.service.users().messages().send(userId="me", body=message)
+            result = await asyncio.to_thread(request.execute)
             return result
         
         except Exception as e:
             raise Exception(f"發送電子郵件時發生錯誤: {str(e)}")
 
+    def send_batch(self, messages: List[dict]) -> Tuple[int, int]:
+        """
+        以單一 Gmail 批次請求發送多封郵件
+        
+        Args:
+            messages: 由 create_message 建立的郵件訊息列表（最多 100 封）
+        
+        Returns:
+            (成功數量, 失敗數量)
+        """
+        counts = {"sent": 0, "failed": 0}
+        
+        def _callback(request_id, response, exception):
+            if exception is None:
+                counts["sent"] += 1
+            else:
+                counts["failed"] += 1
+        
+        batch = self.service.new_batch_http_request(callback=_callback)
+        for message in messages:
+            batch.add(self.service.users().messages().send(userId="me", body=message))
+        batch.execute()
+        
+        return counts["sent"], counts["failed"]
+
 
 # 依賴注入函數
 def get_email_service() -> EmailService:
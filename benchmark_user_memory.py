@@ -0,0 +1,52 @@
+import gc
+import json
+import sys
+import tracemalloc
+import uuid
+from datetime import datetime
+
+from app.core.security import get_password_hash
+from app.models.user_table import UserTable
+
+# 使用者數量，可由命令列參數指定
+USER_COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+# bcrypt 很慢，所有測試使用者共用同一個雜湊值（長度與實際相同）
+hashed_password = get_password_hash("benchmark-password")
+
+# 產生與 users.json 相同格式的測試資料
+users_db = {}
+for i in range(USER_COUNT):
+    user_id = str(uuid.uuid4())
+    users_db[user_id] = {
+        "id": user_id,
+        "email": f"user{i}@example.com",
+        "username": f"user{i}",
+        "hashed_password": hashed_password,
+        "is_active": True,
+        "is_verified": i % 2 == 0,
+        "created_at": datetime.utcnow().isoformat(),
+        "updated_at": None if i % 2 else datetime.utcnow().isoformat()
+    }
+raw = json.dumps(users_db)
+del users_db
+
+
+def measure(build):
+    """量測建立使用者資料所配置的記憶體（位元組）"""
+    gc.collect()
+    tracemalloc.start()
+    data = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del data
+    return size
+
+
+dict_bytes = measure(lambda: json.loads(raw))
+table_bytes = measure(lambda: UserTable.from_users_db(json.loads(raw)))
+
+print(f"使用者數量: {USER_COUNT}")
+print(f"字典格式: {dict_bytes / USER_COUNT:.1f} bytes/user")
+print(f"精簡使用者表: {table_bytes / USER_COUNT:.1f} bytes/user")
+print(f"節省: {(1 - table_bytes / dict_bytes) * 100:.1f}%")
@@ -0,0 +1,37 @@
+import argparse
+import json
+import os
+import shutil
+from datetime import datetime
+
+from app.core.config import settings
+from app.core.user_store import ShardedUserStore, load_users_from_directory
+
+# 離線重新分片工具：請在停止 API 服務後執行
+parser = argparse.ArgumentParser(description="重新分配使用者資料分片")
+parser.add_argument("--shards", type=int, required=True, help="新的分片數量")
+parser.add_argument("--dir", default=settings.USERS_DIR, help="使用者資料目錄")
+parser.add_argument("--from-file", help="從舊版單一 users.json 匯入")
+args = parser.parse_args()
+
+# 讀取現有使用者資料
+if args.from_file:
+    with open(args.from_file, "r") as f:
+        users_db = json.load(f)
+else:
+    users_db = load_users_from_directory(args.dir)
+
+# 寫入新的分片目錄後再與舊目錄交換
+new_dir = f"{args.dir}.resharding"
+if os.path.exists(new_dir):
+    shutil.rmtree(new_dir)
+ShardedUserStore(new_dir, args.shards).save_all(users_db)
+
+if os.path.exists(args.dir):
+    backup_dir = f"{args.dir}.backup-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}"
+    os.replace(args.dir, backup_dir)
+    print(f"舊資料已備份至 {backup_dir}")
+os.replace(new_dir, args.dir)
+
+print(f"已將 {len(users_db)} 位使用者分配至 {args.shards} 個分片")
+print(f"請將 USER_SHARD_COUNT 設為 {args.shards} 後再啟動服務")